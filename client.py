@@ -1,22 +1,67 @@
 import pygame
+import msgspec
 import socket
 import threading
-import pickle
 import math
 import sys
 import time
+from typing import NamedTuple
+
+from protocol import DEC_SERVER_MSG, ClientMsg, GameState, GameDelta, Handshake, ServerFull
+from protocol import send_msg, recv_frame, FrameTooLarge
 
 WIDTH, HEIGHT = 800, 600
 
-players = {}  # {pid: {"pos":(x,y), "color":(r,g,b), "health":int, "kills":int, "is_dead":bool, ...}, ...}
-bullets = []
+players = {}  # {pid: Player(pos, color, health, kills, is_dead), ...}
+bullets = {}  # {bullet_id: Bullet(id, x, y, dx, dy, owner_id), ...}
 my_id = None
 
+class RenderState(NamedTuple):
+    """
+    Just what the render loop draws, as parallel lists of screen positions.
+    Built once per received state (alive players only) so a frame never
+    touches the decoded messages.
+    """
+    players_xy: list   # top-left of each alive player's 20x20 body
+    colors: list
+    green_rects: list  # health bar, filled portion
+    red_rects: list    # health bar, missing portion
+    bullets_xy: list   # top-left of each 8x8 bullet
+
+render_state = RenderState([], [], [], [], [])
+
+def build_render_state(players, bullets):
+    players_xy = []
+    colors = []
+    green_rects = []
+    red_rects = []
+    bar_width = 20
+    bar_height = 5
+    for pdata in players.values():
+        # Let's not draw a dead player at all
+        if pdata.is_dead:
+            continue
+
+        (px, py), health = pdata.pos, pdata.health
+        players_xy.append((px - 10, py - 10))
+        colors.append(pdata.color)
+
+        # Health bar above the player, red background for missing portion
+        health_ratio = max(0, health) / 100.0
+        green_width = int(bar_width * health_ratio)
+        green_rects.append((px - 10, py - 20, green_width, bar_height))
+        red_rects.append((px - 10 + green_width, py - 20,
+                          int(bar_width * (1 - health_ratio)), bar_height))
+
+    bullets_xy = [(b.x - 4, b.y - 4) for b in bullets.values()]
+    return RenderState(players_xy, colors, green_rects, red_rects, bullets_xy)
+
 HOST = "127.0.0.1"
 PORT = 5555
-client_socket = None
-
-lock = threading.Lock()
+client_socket = None  # TCP: handshake and other reliable messages
+udp_socket = None     # UDP: per-tick game state
+last_tick = -1        # newest GameState tick applied, older datagrams are dropped
+send_buf = bytearray()  # reused to encode every outgoing message
 
 # We'll track time_left from the server to display a countdown
 time_left = 300  # default 5 minutes if not started
@@ -29,60 +74,154 @@ dy = 0
 pygame.init()
 font = pygame.font.SysFont(None, 36)  # for on-screen text (timer, scoreboard, etc.)
 
+# Rendered text surfaces keyed by (text, color). Leaderboard rows only change
+# on a kill and the timer once a second, so almost every frame is a cache hit.
+_text_cache = {}
+
+def render_text(text, color=(255, 255, 255)):
+    surf = _text_cache.get((text, color))
+    if surf is None:
+        # Antialiased text has per-pixel alpha, keep it with convert_alpha
+        surf = font.render(text, True, color).convert_alpha()
+        _text_cache[(text, color)] = surf
+    return surf
+
+# Pre-filled surfaces so a frame is a couple of batched screen.blits calls
+# instead of one draw.rect per entity. They're converted to the display's
+# pixel format (once the window exists) so blitting them is a plain copy.
+player_surf_cache = {}  # {color: 20x20 Surface}
+bullet_surf = pygame.Surface((8, 8))
+bullet_surf.fill((255, 0, 0))
+
+def player_surface(color):
+    surf = player_surf_cache.get(color)
+    if surf is None:
+        surf = pygame.Surface((20, 20))
+        surf.fill(color)
+        surf = surf.convert()
+        player_surf_cache[color] = surf
+    return surf
+
 def receive_data():
-    global players, bullets, time_left
+    """Reliable messages from the server over TCP."""
+    while True:
+        try:
+            data = recv_frame(client_socket)
+        except FrameTooLarge as e:
+            print(f"[BAD FRAME] {e}, disconnecting")
+            break
+        except OSError:
+            break
+        if data is None:
+            break
 
+        # A bad frame is skipped, the next one is still intact
+        try:
+            msg = DEC_SERVER_MSG.decode(data)
+        except msgspec.DecodeError as e:
+            print(f"[BAD FRAME] {e}")
+            continue
+
+        # Special messages (server_full, etc.)
+        if isinstance(msg, ServerFull):
+            print("Server is full. Exiting.")
+            pygame.quit()
+            sys.exit()
+
+def receive_state():
+    """Game state broadcasts from the server over UDP, one datagram per tick."""
     while True:
         try:
-            data = client_socket.recv(4096)
-            if not data:
-                break
-            msg = pickle.loads(data)
-
-            # Special messages (server_full, handshake, etc.)
-            if "action" in msg:
-                if msg["action"] == "server_full":
-                    print("Server is full. Exiting.")
-                    pygame.quit()
-                    sys.exit()
-
-            # Normal game state broadcast
-            if "players" in msg and "bullets" in msg:
-                with lock:
-                    players = msg["players"]
-                    bullets = msg["bullets"]
-                    time_left = msg.get("time_left", 300)
-
-        except:
+            data = udp_socket.recv(65536)
+        except OSError:
             break
 
-def send_to_server(message_dict):
+        try:
+            msg = DEC_SERVER_MSG.decode(data)
+        except msgspec.DecodeError as e:
+            print(f"[BAD DATAGRAM] {e}")
+            continue
+
+        # Skip anything that arrived out of order
+        if not isinstance(msg, (GameState, GameDelta)) or msg.tick <= last_tick:
+            continue
+
+        apply_state(msg)
+
+def apply_state(msg):
+    """
+    Apply a GameState snapshot or a GameDelta on top of what we have.
+    New dicts are built and then swapped in, never mutated once published,
+    so the render loop can read players/bullets without a lock (it just
+    sees the old or the new state).
+    """
+    global players, bullets, time_left, last_tick, render_state
+
+    if isinstance(msg, GameState):
+        new_players = msg.players
+        new_bullets = {b.id: b for b in msg.bullets}
+    else:
+        if last_tick < 0:
+            return  # nothing to apply a delta to until the first snapshot
+
+        # Bullets we already know keep flying at dx/dy per tick
+        ticks = msg.tick - last_tick
+        removed = set(msg.removed_bullets)
+        new_bullets = {
+            bid: msgspec.structs.replace(b, x=b.x + b.dx * ticks, y=b.y + b.dy * ticks)
+            for bid, b in bullets.items() if bid not in removed
+        }
+        for b in msg.new_bullets:
+            new_bullets[b.id] = b
+
+        removed = set(msg.removed_players)
+        new_players = {pid: p for pid, p in players.items() if pid not in removed}
+        new_players.update(msg.players)
+
+    # Each assignment is atomic under the GIL
+    players = new_players
+    bullets = new_bullets
+    render_state = build_render_state(new_players, new_bullets)
+    time_left = msg.time_left
+    last_tick = msg.tick
+
+def send_to_server(msg):
     try:
-        data = pickle.dumps(message_dict)
-        client_socket.sendall(data)
+        send_msg(client_socket, msg, send_buf)
     except:
         pass
 
+# Leaderboard rows as of the last (pid, kills) signature, only re-sorted when it changes
+_lb_sig = None
+_lb_cache = []
+
 def draw_leaderboard(screen):
     """
     Draw a simple leaderboard in the top-right corner,
     listing all players by kills descending, or by ID for a simpler approach.
     """
-    # Sort players by kills descending
-    sorted_players = sorted(players.items(), key=lambda p: p[1]["kills"], reverse=True)
+    global _lb_sig, _lb_cache
+
+    sig = tuple((pid, pdata.kills) for pid, pdata in players.items())
+    if sig != _lb_sig:
+        # Sort players by kills descending
+        _lb_cache = [
+            f"Player {pid}: {kills} kills"
+            for pid, kills in sorted(sig, key=lambda p: p[1], reverse=True)
+        ]
+        _lb_sig = sig
+
     # Start from some top-right position
     x_start = WIDTH - 200
     y_start = 20
     line_height = 30
 
-    label = font.render("Leaderboard", True, (255,255,255))
+    label = render_text("Leaderboard")
     screen.blit(label, (x_start, y_start))
     y_offset = y_start + line_height
 
-    for pid, pdata in sorted_players:
-        kills = pdata["kills"]
-        text_str = f"Player {pid}: {kills} kills"
-        text_surf = font.render(text_str, True, (255, 255, 255))
+    for text_str in _lb_cache:
+        text_surf = render_text(text_str)
         screen.blit(text_surf, (x_start, y_offset))
         y_offset += line_height
 
@@ -93,38 +232,68 @@ def draw_timer(screen):
     minutes = int(time_left // 60)
     seconds = int(time_left % 60)
     timer_str = f"{minutes:02d}:{seconds:02d}"
-    text_surf = font.render(timer_str, True, (255, 255, 255))
+    text_surf = render_text(timer_str)
     screen.blit(text_surf, (20, 20))
 
 def main():
-    global client_socket, my_id, dx, dy
+    global client_socket, udp_socket, my_id, dx, dy, bullet_surf
 
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client_socket.connect((HOST, PORT))
     client_socket.setblocking(True)
 
     # Receive initial handshake
-    initial_data = client_socket.recv(4096)
-    handshake = pickle.loads(initial_data)
+    try:
+        initial_data = recv_frame(client_socket)
+    except FrameTooLarge as e:
+        print(f"[BAD FRAME] {e}")
+        initial_data = None
+    if initial_data is None:
+        print("Server closed the connection. Exiting.")
+        client_socket.close()
+        return
+    try:
+        handshake = DEC_SERVER_MSG.decode(initial_data)
+    except msgspec.DecodeError:
+        handshake = None  # handled as an improper handshake below
 
-    if handshake.get("action") == "server_full":
+    if isinstance(handshake, ServerFull):
         print("Server is full. Exiting.")
         client_socket.close()
         return
 
-    if handshake.get("action") == "handshake":
-        my_id = handshake.get("player_id")
+    if isinstance(handshake, Handshake):
+        my_id = handshake.player_id
         print(f"[HANDSHAKE] My ID is {my_id}")
     else:
         print("Did not receive a proper handshake. Exiting.")
         client_socket.close()
         return
 
-    # Start background thread to get updates
+    # Tell the server where to send the game state
+    # Listen only on the interface the TCP connection uses, and connect to the
+    # server's UDP address so the kernel drops datagrams from anyone else
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.bind((client_socket.getsockname()[0], 0))
+    udp_socket.connect(client_socket.getpeername())
+    send_to_server(ClientMsg(
+        action="udp_port",
+        player_id=my_id,
+        udp_port=udp_socket.getsockname()[1]
+    ))
+
+    # Start background threads to get updates
     threading.Thread(target=receive_data, daemon=True).start()
+    threading.Thread(target=receive_state, daemon=True).start()
 
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    # SCALED goes through SDL2's renderer, which batches our runs of same-texture
+    # blits; vsync isn't available everywhere, so fall back to a plain window
+    try:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.DOUBLEBUF, vsync=1)
+    except pygame.error:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.DOUBLEBUF)
     pygame.display.set_caption("Multiplayer Shooter with Timer & Leaderboard")
+    bullet_surf = bullet_surf.convert()
 
     clock = pygame.time.Clock()
 
@@ -132,12 +301,15 @@ def main():
     while running:
         clock.tick(60)
 
+        # Look ourselves up once per frame
+        me = players.get(my_id)
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
             # If we're dead, skip movement and shooting
-            if my_id in players and players[my_id].get("is_dead"):
+            if me is not None and me.is_dead:
                 continue
 
             if event.type == pygame.KEYDOWN:
@@ -153,25 +325,26 @@ def main():
                 if event.key == pygame.K_SPACE:
                     # Shoot
                     mouse_x, mouse_y = pygame.mouse.get_pos()
-                    with lock:
-                        if my_id in players:
-                            px, py = players[my_id]["pos"]
-                        else:
-                            px, py = (WIDTH//2, HEIGHT//2)
+                    if me is not None:
+                        px, py = me.pos
+                    else:
+                        px, py = (WIDTH//2, HEIGHT//2)
 
                     dir_x = mouse_x - px
                     dir_y = mouse_y - py
-                    length = math.hypot(dir_x, dir_y)
+                    # Plain sqrt is enough for pixel offsets, no need for hypot's overflow handling
+                    length_sq = dir_x * dir_x + dir_y * dir_y
+                    length = math.sqrt(length_sq) if length_sq else 0.0
                     if length != 0:
                         dir_x /= length
                         dir_y /= length
 
-                    send_to_server({
-                        "action": "shoot",
-                        "player_id": my_id,
-                        "dx": dir_x,
-                        "dy": dir_y
-                    })
+                    send_to_server(ClientMsg(
+                        action="shoot",
+                        player_id=my_id,
+                        dx=dir_x,
+                        dy=dir_y
+                    ))
 
             if event.type == pygame.KEYUP:
                 if event.key in (pygame.K_w, pygame.K_s):
@@ -180,15 +353,14 @@ def main():
                     dx = 0
 
         # Send movement if alive
-        with lock:
-            if my_id in players and not players[my_id]["is_dead"]:
-                if dx != 0 or dy != 0:
-                    send_to_server({
-                        "action": "move",
-                        "player_id": my_id,
-                        "dx": dx,
-                        "dy": dy
-                    })
+        if me is not None and not me.is_dead:
+            if dx != 0 or dy != 0:
+                send_to_server(ClientMsg(
+                    action="move",
+                    player_id=my_id,
+                    dx=dx,
+                    dy=dy
+                ))
 
         screen.fill((30, 30, 30))
 
@@ -198,56 +370,28 @@ def main():
         # Draw leaderboard (top-right)
         draw_leaderboard(screen)
 
-        with lock:
-            # Draw players
-            for pid, pdata in players.items():
-                px, py = pdata["pos"]
-                color = pdata["color"]
-                health = pdata["health"]
-                is_dead = pdata["is_dead"]
-
-                # If dead, optionally skip drawing the player, or draw them differently
-                if is_dead:
-                    # Let's not draw a dead player at all
-                    continue
-
-                # Draw the player's 20x20 rect
-                
-                # spawn each player's image
-                pygame.draw.rect(screen, color, (px - 10, py - 10, 20, 20))
-
-                # Health bar above the player
-                
-                # instead of health rectangles we have health images
-                bar_width = 20
-                bar_height = 5
-                health_ratio = max(0, health) / 100.0
-                pygame.draw.rect(screen, (0, 255, 0),
-                                 (px - 10, py - 20, int(bar_width * health_ratio), bar_height))
-                # Red background for missing portion
-                pygame.draw.rect(screen, (255, 0, 0),
-                                 (px - 10 + int(bar_width * health_ratio),
-                                  py - 20,
-                                  int(bar_width * (1 - health_ratio)),
-                                  bar_height))
-
-            # Draw bullets
-            
-            # bullet custom images 
-            for b in bullets:
-                bx, by = b["x"], b["y"]
-                pygame.draw.rect(screen, (255, 0, 0), (bx - 4, by - 4, 8, 8))
-
-            # If we're dead, show the gray box with "YOU DIED!"
-            if my_id in players and players[my_id]["is_dead"]:
-                dead_surf = font.render("YOU DIED!", True, (255, 0, 0))
-                rect = dead_surf.get_rect(center=(WIDTH//2, HEIGHT//2))
-                screen.blit(dead_surf, rect)
+        # Draw players, their health bars and bullets
+        rs = render_state
+        screen.blits([(player_surface(color), xy) for color, xy in zip(rs.colors, rs.players_xy)],
+                     doreturn=False)
+        # fill is cheaper than draw.rect for plain axis-aligned boxes
+        for rect in rs.green_rects:
+            screen.fill((0, 255, 0), rect)
+        for rect in rs.red_rects:
+            screen.fill((255, 0, 0), rect)
+        screen.blits([(bullet_surf, xy) for xy in rs.bullets_xy], doreturn=False)
+
+        # If we're dead, show the gray box with "YOU DIED!"
+        if me is not None and me.is_dead:
+            dead_surf = render_text("YOU DIED!", (255, 0, 0))
+            rect = dead_surf.get_rect(center=(WIDTH//2, HEIGHT//2))
+            screen.blit(dead_surf, rect)
 
         pygame.display.flip()
 
     pygame.quit()
     client_socket.close()
+    udp_socket.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+import struct
+from typing import Annotated, Union
+
+import msgspec
+
+# Wire messages shared by server.py and client.py.
+# Everything is encoded with msgpack; structs are encoded as arrays
+# (array_like) so field names never go over the wire.
+
+class Player(msgspec.Struct, array_like=True):
+    pos: tuple[float, float]
+    color: tuple[int, int, int]
+    health: int = 100
+    kills: int = 0
+    is_dead: bool = False
+
+class Bullet(msgspec.Struct, array_like=True):
+    id: int  # unique per bullet, so deltas can refer to it
+    x: float
+    y: float
+    dx: float
+    dy: float
+    owner_id: int
+
+# Server -> client
+class Handshake(msgspec.Struct, tag="handshake", array_like=True):
+    player_id: int
+    max_players: int
+
+class ServerFull(msgspec.Struct, tag="server_full", array_like=True):
+    pass
+
+# Game state goes over UDP: a full GameState snapshot every few ticks and a
+# GameDelta against the previous broadcast otherwise. tick only ever
+# increases, so a client can drop datagrams that arrive late or out of order.
+class GameState(msgspec.Struct, tag="state", array_like=True):
+    tick: int
+    players: dict[int, Player]
+    bullets: list[Bullet]  # positions as of tick
+    time_left: float
+
+class GameDelta(msgspec.Struct, tag="delta", array_like=True):
+    tick: int
+    players: dict[int, Player]  # only players that changed or joined
+    removed_players: list[int]
+    new_bullets: list[Bullet]   # positions as of tick, older bullets keep flying at dx/dy per tick
+    removed_bullets: list[int]
+    time_left: float
+
+ServerMsg = Union[Handshake, ServerFull, GameState, GameDelta]
+
+# Client -> server ("move", "shoot", or "udp_port" to say where to send state).
+# dx/dy are a move step or a unit shot direction; the bounds also reject NaN/inf.
+MAX_STEP = 10.0
+Step = Annotated[float, msgspec.Meta(ge=-MAX_STEP, le=MAX_STEP)]
+
+class ClientMsg(msgspec.Struct, array_like=True):
+    action: str
+    player_id: int
+    dx: Step = 0.0
+    dy: Step = 0.0
+    udp_port: Annotated[int, msgspec.Meta(ge=0, le=65535)] = 0  # 0 on move/shoot
+
+ENC = msgspec.msgpack.Encoder()
+DEC_SERVER_MSG = msgspec.msgpack.Decoder(ServerMsg)
+DEC_CLIENT_MSG = msgspec.msgpack.Decoder(ClientMsg)
+
+# Framing: TCP is a byte stream, so every message is sent as a 4-byte
+# big-endian length followed by the msgpack payload.
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024  # largest payload we accept; a real message is far smaller
+
+class FrameTooLarge(ValueError):
+    """A frame header announced more than MAX_FRAME bytes. The stream can't be trusted after this."""
+
+def encode_frame(msg, buf=None):
+    """
+    Encode msg as a length-prefixed frame. The payload is encoded straight
+    into buf after the header, so it never gets copied to prepend it.
+    Pass a bytearray as buf to reuse it between calls.
+    """
+    if buf is None:
+        buf = bytearray(HEADER.size)
+    ENC.encode_into(msg, buf, HEADER.size)
+    HEADER.pack_into(buf, 0, len(buf) - HEADER.size)
+    return buf
+
+def send_msg(sock, msg, buf=None):
+    """Send msg as one length-prefixed frame in a single sendall call."""
+    sock.sendall(encode_frame(msg, buf))
+
+def recv_exact(sock, n):
+    """Read exactly n bytes from sock. Returns None if the peer closed."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    offset = 0
+    while offset < n:
+        count = sock.recv_into(view[offset:])
+        if not count:
+            return None
+        offset += count
+    return buf
+
+def recv_frame(sock):
+    """
+    Read one length-prefixed frame payload. Returns None if the peer closed.
+    Raises FrameTooLarge before reading a payload over MAX_FRAME.
+    """
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise FrameTooLarge(f"frame of {length} bytes is over MAX_FRAME ({MAX_FRAME})")
+    return recv_exact(sock, length)
+
+def unpack_frames(buf):
+    """
+    Remove every complete frame from the front of buf (a bytearray of
+    received bytes) and return their payloads. A trailing partial frame
+    stays in buf until the rest of it arrives. Raises FrameTooLarge as soon
+    as a header announces more than MAX_FRAME, so buf can't grow unbounded.
+    """
+    payloads = []
+    offset = 0
+    while len(buf) - offset >= HEADER.size:
+        (length,) = HEADER.unpack_from(buf, offset)
+        if length > MAX_FRAME:
+            raise FrameTooLarge(f"frame of {length} bytes is over MAX_FRAME ({MAX_FRAME})")
+        end = offset + HEADER.size + length
+        if end > len(buf):
+            break
+        payloads.append(bytes(buf[offset + HEADER.size:end]))
+        offset = end
+    del buf[:offset]
+    return payloads
@@ -1,30 +1,56 @@
 import socket
+import selectors
 import threading
-import pickle
+import queue
 import time
 import random
+import copy
+from collections import deque
+
+import msgspec
+import numpy as np
+from numba import njit
+
+from protocol import ENC, DEC_CLIENT_MSG, Player, Bullet, GameState, GameDelta, Handshake, ServerFull
+from protocol import encode_frame, send_msg, unpack_frames, FrameTooLarge
 
 HOST = "127.0.0.1"
 PORT = 5555
 MAX_PLAYERS = 5
 
-# Each player's data:
-# players[player_id] = {
-#   "pos": (x, y),
-#   "color": (r, g, b),
-#   "health": int,
-#   "kills": int,
-#   "is_dead": bool,
-#   "respawn_time": float  (timestamp when they'll respawn),
-# }
+# players[player_id] = Player(pos, color, health, kills, is_dead)  (see protocol.py)
 players = {}
-# bullets: list of dicts: { "x": float, "y": float, "dx": float, "dy": float, "owner_id": int }
-bullets = []
 next_player_id = 0
 
-client_sockets = []
 player_connections = {}  # map player_id -> socket for direct messages
 
+# Game state goes out over UDP (one datagram per client per tick); TCP is
+# only used for the handshake and other messages that must arrive.
+udp_sock = None
+udp_clients = {}  # map player_id -> (ip, port) the client told us over TCP
+tick_id = 0
+udp_buf = bytearray()  # reused for every state datagram
+MAX_DATAGRAM = 65507  # largest UDP payload over IPv4
+
+# Most ticks only send what changed since the previous broadcast; a full
+# snapshot goes out every SNAPSHOT_INTERVAL ticks (or when someone joins)
+# so clients recover from lost datagrams.
+SNAPSHOT_INTERVAL = 30
+force_snapshot = False
+# Ticks where nothing changed aren't broadcast at all (besides the snapshot
+# heartbeat); anything that changes players or bullets sets state_dirty.
+state_dirty = False
+sent_seconds = None  # whole seconds of time_left as last broadcast
+sent_players = {}  # map player_id -> copy of the Player as last broadcast
+sent_bullet_ids = np.empty(0, dtype=np.int64)
+
+# Outgoing frames are queued per client and written by io_loop, so a
+# slow client can never stall the game loop.
+outbound = {}  # map socket -> deque of memoryviews still to be written
+# Only the handshake and direct messages go through this queue, so a client
+# with this many still pending has stopped reading and gets dropped
+MAX_QUEUED_FRAMES = 64
+
 # Game timer: starts (5 minutes = 300s) once we have at least 2 players
 game_start_time = None
 GAME_DURATION = 300  # 5 minutes in seconds
@@ -32,240 +58,489 @@ GAME_DURATION = 300  # 5 minutes in seconds
 # A lock for thread-safe updates
 lock = threading.Lock()
 
-def handle_client(conn, addr, player_id):
-    """Receive data from the client and update global state accordingly."""
-    print(f"[NEW CONNECTION] Player {player_id} connected from {addr}")
-    try:
-        while True:
-            data = conn.recv(4096)
-            if not data:
-                break
+# (player_id, ClientMsg) pairs read by io_loop, applied by game_loop each tick
+inputs = queue.SimpleQueue()
 
-            try:
-                msg = pickle.loads(data)
-            except:
-                continue
-
-            with lock:
-                action = msg.get("action")
-                pid = msg.get("player_id")  # Which client sent it
+class ClientCtx:
+    """Per-connection state, owned by io_loop."""
+    def __init__(self, player_id, addr):
+        self.player_id = player_id
+        self.addr = addr
+        self.recv_buf = bytearray()  # bytes received but not yet a whole frame
+        self.events = selectors.EVENT_READ
 
-                # Ignore commands from a dead player
-                if pid in players and players[pid]["is_dead"]:
-                    continue
+class Bullets:
+    """
+    Every live bullet, stored as parallel numpy arrays (one per field) so a
+    tick can move, cull and collide all of them in step_bullets.
+    Only the first n slots are live.
+    """
+    def __init__(self, capacity=256):
+        self.n = 0
+        self.next_id = 0
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.xs = np.empty(capacity, dtype=np.float32)
+        self.ys = np.empty(capacity, dtype=np.float32)
+        self.dxs = np.empty(capacity, dtype=np.float32)
+        self.dys = np.empty(capacity, dtype=np.float32)
+        self.owner_ids = np.empty(capacity, dtype=np.int64)
+
+    FIELDS = ("ids", "xs", "ys", "dxs", "dys", "owner_ids")
+
+    def add(self, x, y, dx, dy, owner_id):
+        if self.n == len(self.xs):
+            # Full, double the capacity
+            for name in self.FIELDS:
+                old = getattr(self, name)
+                new = np.empty(len(old) * 2, dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+
+        i = self.n
+        self.ids[i] = self.next_id
+        self.xs[i] = x
+        self.ys[i] = y
+        self.dxs[i] = dx
+        self.dys[i] = dy
+        self.owner_ids[i] = owner_id
+        self.n += 1
+        self.next_id += 1
+
+    def to_wire(self, mask=None):
+        """Bullet structs for the live slots (or just the ones where mask is True)."""
+        columns = [getattr(self, name)[:self.n] for name in self.FIELDS]
+        if mask is not None:
+            columns = [col[mask] for col in columns]
+        return [
+            Bullet(id=bid, x=x, y=y, dx=dx, dy=dy, owner_id=owner_id)
+            for bid, x, y, dx, dy, owner_id in zip(*(col.tolist() for col in columns))
+        ]
+
+bullets = Bullets()
+# A snapshot carries every live bullet in one datagram (~47 bytes each at
+# worst), so shots are ignored past this many to keep it under MAX_DATAGRAM
+MAX_BULLETS = 1000
+
+# Collision broad phase: a uniform grid over the 800x600 map
+HIT_RANGE = 14  # max center distance per axis for an 8x8 bullet to touch a 20x20 player
+CELL_SIZE = 32
+GRID_COLS = 800 // CELL_SIZE + 1
+GRID_ROWS = 600 // CELL_SIZE + 1
+
+def apply_client_msg(pid, msg):
+    """Apply one decoded client message to the game state. Caller holds lock."""
+    global state_dirty
+
+    # Ignore commands from a dead (or already disconnected) player
+    if pid not in players or players[pid].is_dead:
+        return
+
+    if msg.action == "move":
+        px, py = players[pid].pos
+        players[pid].pos = (px + msg.dx, py + msg.dy)
+        state_dirty = True
+
+    elif msg.action == "shoot":
+        if bullets.n >= MAX_BULLETS:
+            return
+        px, py = players[pid].pos
+        bullet_speed = 10
+        bullets.add(
+            x=px,
+            y=py,
+            dx=msg.dx * bullet_speed,
+            dy=msg.dy * bullet_speed,
+            owner_id=pid
+        )
+        state_dirty = True
+
+def read_client(selector, conn, ctx):
+    """Read whatever conn has for us and queue every complete message."""
+    global force_snapshot
 
-                if action == "move":
-                    dx = msg.get("dx", 0)
-                    dy = msg.get("dy", 0)
-                    if pid in players:
-                        px, py = players[pid]["pos"]
-                        players[pid]["pos"] = (px + dx, py + dy)
-
-                elif action == "shoot":
-                    dx = msg.get("dx", 0)
-                    dy = msg.get("dy", 0)
-                    if pid in players:
-                        px, py = players[pid]["pos"]
-                        bullet_speed = 10
-                        bullets.append({
-                            "x": px,
-                            "y": py,
-                            "dx": dx * bullet_speed,
-                            "dy": dy * bullet_speed,
-                            "owner_id": pid
-                        })
-    except Exception as e:
+    try:
+        data = conn.recv(65536)
+    except BlockingIOError:
+        return
+    except OSError as e:
         print(f"[EXCEPTION] {e}")
-    finally:
-        with lock:
-            if player_id in players:
-                del players[player_id]
-            if conn in client_sockets:
-                client_sockets.remove(conn)
-            if player_id in player_connections:
-                del player_connections[player_id]
+        data = b""
+    if not data:
+        disconnect_client(selector, conn, ctx)
+        return
 
-        conn.close()
-        print(f"[DISCONNECT] Player {player_id} disconnected")
+    ctx.recv_buf += data
+    try:
+        payloads = unpack_frames(ctx.recv_buf)
+    except FrameTooLarge as e:
+        # Framing is lost at this point, there's no next frame to skip to
+        print(f"[BAD FRAME] Player {ctx.player_id}: {e}, disconnecting")
+        disconnect_client(selector, conn, ctx)
+        return
+
+    for payload in payloads:
+        # A frame that doesn't decode to a ClientMsg is dropped on its own
+        try:
+            msg = DEC_CLIENT_MSG.decode(payload)
+        except msgspec.DecodeError as e:
+            print(f"[BAD FRAME] Player {ctx.player_id}: {e}")
+            continue
+        if msg.action == "udp_port":
+            if not msg.udp_port:  # 0 is the default, not a port we can send to
+                continue
+            with lock:
+                udp_clients[ctx.player_id] = (ctx.addr[0], msg.udp_port)
+                force_snapshot = True  # the new client has nothing to apply deltas to
+            continue
+        inputs.put((ctx.player_id, msg))
+
+def disconnect_client(selector, conn, ctx):
+    global state_dirty
+
+    player_id = ctx.player_id
+    with lock:
+        state_dirty = True
+        if player_id in players:
+            del players[player_id]
+        if player_id in player_connections:
+            del player_connections[player_id]
+        udp_clients.pop(player_id, None)
+        outbound.pop(conn, None)
+
+    selector.unregister(conn)
+    conn.close()
+    print(f"[DISCONNECT] Player {player_id} disconnected")
+
+def get_time_left():
+    """Seconds left on the game timer."""
+    # Calculate time_left if we have at least 2 players and the timer started
+    if game_start_time is not None:
+        elapsed = time.time() - game_start_time
+        return max(0, GAME_DURATION - elapsed)
+    return GAME_DURATION  # or just 0, if you prefer not showing a timer until it starts
 
 def broadcast_game_state():
     """
-    Sends the entire game state (players, bullets) plus
-    the countdown timer (time_left) to all clients.
+    Sends the game state (players, bullets) plus the countdown timer
+    (time_left) to all clients, as a full snapshot or a delta.
     """
-    global game_start_time
-    # Calculate time_left if we have at least 2 players and the timer started
-    if game_start_time is not None:
-        elapsed = time.time() - game_start_time
-        time_left = max(0, GAME_DURATION - elapsed)
+    global force_snapshot, sent_players, sent_bullet_ids, sent_seconds
+    time_left = get_time_left()
+
+    bullet_ids = bullets.ids[:bullets.n].copy()
+    if force_snapshot or tick_id % SNAPSHOT_INTERVAL == 0:
+        game_state = GameState(
+            tick=tick_id,
+            players=players,   # includes positions, colors, health, kills, is_dead, etc.
+            bullets=bullets.to_wire(),
+            time_left=time_left
+        )
     else:
-        time_left = GAME_DURATION  # or just 0, if you prefer not showing a timer until it starts
-
-    game_state = {
-        "players": players,   # includes positions, colors, health, kills, is_dead, etc.
-        "bullets": bullets,
-        "time_left": time_left
-    }
-    data = pickle.dumps(game_state)
-
-    for cs in client_sockets:
-        try:
-            cs.sendall(data)
-        except:
-            pass
+        game_state = GameDelta(
+            tick=tick_id,
+            players={pid: p for pid, p in players.items() if sent_players.get(pid) != p},
+            removed_players=[pid for pid in sent_players if pid not in players],
+            new_bullets=bullets.to_wire(~np.isin(bullet_ids, sent_bullet_ids)),
+            removed_bullets=sent_bullet_ids[~np.isin(sent_bullet_ids, bullet_ids)].tolist(),
+            time_left=time_left
+        )
+
+    # Encode once into the reused buffer, every client gets the same datagram
+    ENC.encode_into(game_state, udp_buf)
+    if len(udp_buf) > MAX_DATAGRAM:
+        # sendto would fail with EMSGSIZE for every client, say so instead.
+        # Nobody got this state, so the next delta stays against the last one sent.
+        print(f"[UDP] state of {len(udp_buf)} bytes is over MAX_DATAGRAM ({MAX_DATAGRAM}), not sent")
+        return
+
+    # Remember what clients now have, Players are mutated in place so copy them
+    force_snapshot = False
+    sent_players = {pid: copy.copy(p) for pid, p in players.items()}
+    sent_bullet_ids = bullet_ids
+    sent_seconds = int(time_left)
+
+    with memoryview(udp_buf) as data:
+        for addr in udp_clients.values():
+            try:
+                udp_sock.sendto(data, addr)
+            except OSError:
+                pass  # a lost datagram is fine, the next tick replaces it
 
-def send_msg_to_player(pid, msg_dict):
+def send_msg_to_player(pid, msg):
     """
-    Send a specific dictionary message to one player (if connected).
+    Send a specific message struct to one player (if connected).
     """
     if pid in player_connections:
+        queue_frame(player_connections[pid], encode_frame(msg))
+
+def queue_frame(sock, frame):
+    """
+    Queue an already framed message for sock without blocking.
+    A client whose queue is past the high-water mark is disconnected instead.
+    """
+    pending = outbound.get(sock)
+    if pending is None:
+        return
+    if len(pending) >= MAX_QUEUED_FRAMES:
+        print("[SLOW CLIENT] Outbound queue full, dropping connection")
+        outbound.pop(sock, None)
         try:
-            player_connections[pid].sendall(pickle.dumps(msg_dict))
-        except:
+            # io_loop sees EOF on it and cleans up the player
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
             pass
-
-def check_bullet_collisions():
+        return
+    pending.append(memoryview(frame))
+
+def flush_socket(sock):
+    """Write as much of sock's queue as the kernel will take right now."""
+    pending = outbound.get(sock)
+    while pending:
+        view = pending[0]
+        try:
+            sent = sock.send(view)
+        except BlockingIOError:
+            return
+        except OSError:
+            pending.clear()
+            return
+        if sent < len(view):
+            pending[0] = view[sent:]
+            return
+        pending.popleft()
+
+def io_loop(server):
     """
-    For each bullet, check if it collides with any *alive* player (besides its owner).
-    If collision: reduce health by 25. If health <= 0 -> record a kill, set dead status, schedule respawn.
-    Remove the bullet on collision (no piercing).
+    Single I/O thread: accepts new players, reads every client's input into
+    the inputs queue, and writes queued frames to sockets that can take them.
     """
-    global bullets
-
-    surviving_bullets = []
-
-    for b in bullets:
-        bx, by = b["x"], b["y"]
-        owner_id = b["owner_id"]
-        hit_something = False
-
-        for pid, pdata in list(players.items()):
-            if pid == owner_id or pdata["is_dead"]:
-                continue  # skip the bullet's owner and dead players
-
-            # bullet bounding box = (bx-4, by-4, 8x8)
-            bullet_left = bx - 4
-            bullet_right = bx + 4
-            bullet_top = by - 4
-            bullet_bottom = by + 4
-
-            # player bounding box = (px-10, py-10, 20x20)
-            px, py = pdata["pos"]
-            player_left = px - 10
-            player_right = px + 10
-            player_top = py - 10
-            player_bottom = py + 10
-
-            if (bullet_right >= player_left and
-                bullet_left <= player_right and
-                bullet_bottom >= player_top and
-                bullet_top <= player_bottom):
-                # We have a collision
-                pdata["health"] -= 25
-                hit_something = True
-
-                if pdata["health"] <= 0:
-                    # Owner gets a kill
-                    if owner_id in players:
-                        players[owner_id]["kills"] += 1
-
-                    # Mark victim as dead, set 5s respawn
-                    pdata["is_dead"] = True
-                    pdata["health"] = 0  # just to be sure
-
-                break
-
-        if not hit_something:
-            surviving_bullets.append(b)
-
-    bullets = surviving_bullets
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    while True:
+        for key, mask in selector.select(timeout=0.005):
+            if key.fileobj is server:
+                accept_client(selector, server)
+                continue
+            conn, ctx = key.fileobj, key.data
+            if mask & selectors.EVENT_WRITE:
+                flush_socket(conn)
+            if mask & selectors.EVENT_READ:
+                read_client(selector, conn, ctx)
+
+        # Only ask for EVENT_WRITE while a client has frames waiting
+        for key in list(selector.get_map().values()):
+            if key.fileobj is server:
+                continue
+            events = selectors.EVENT_READ
+            if outbound.get(key.fileobj):
+                events |= selectors.EVENT_WRITE
+            if events != key.data.events:
+                key.data.events = events
+                selector.modify(key.fileobj, events, key.data)
+
+@njit(cache=True)
+def step_bullets(ids, xs, ys, dxs, dys, owner_ids, n, player_ids, pxs, pys, dead, health):
+    """
+    Compiled per-tick bullet kernel over the Bullets arrays and per-player arrays.
+    Moves each bullet, drops it if it left the map, then checks it against
+    every *alive* player (besides its owner). On a hit the player loses 25
+    health (dying at 0) and the bullet is removed (no piercing).
+    Survivors are compacted in place. Returns the new bullet count and the
+    owner id of every bullet that got a kill.
+    """
+    # Broad phase grid: mark every cell an alive player's hit area touches
+    occupied = np.zeros((GRID_ROWS, GRID_COLS), dtype=np.bool_)
+    for j in range(len(player_ids)):
+        if dead[j]:
+            continue
+        row0 = max(0, int((pys[j] - HIT_RANGE) // CELL_SIZE))
+        row1 = min(GRID_ROWS, max(0, int((pys[j] + HIT_RANGE) // CELL_SIZE) + 1))
+        col0 = max(0, int((pxs[j] - HIT_RANGE) // CELL_SIZE))
+        col1 = min(GRID_COLS, max(0, int((pxs[j] + HIT_RANGE) // CELL_SIZE) + 1))
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                occupied[row, col] = True
+
+    kill_owners = np.empty(n, dtype=np.int64)
+    kills = 0
+    kept = 0
+    for i in range(n):
+        x = xs[i] + dxs[i]
+        y = ys[i] + dys[i]
+        if not (0 <= x <= 800 and 0 <= y <= 600):  # also drops NaN/inf
+            continue
+
+        hit = False
+        if occupied[int(y // CELL_SIZE), int(x // CELL_SIZE)]:
+            for j in range(len(player_ids)):
+                if dead[j] or owner_ids[i] == player_ids[j]:
+                    continue
+                if abs(x - pxs[j]) <= HIT_RANGE and abs(y - pys[j]) <= HIT_RANGE:
+                    health[j] -= 25
+                    if health[j] <= 0:
+                        health[j] = 0
+                        dead[j] = True
+                        kill_owners[kills] = owner_ids[i]
+                        kills += 1
+                    hit = True
+                    break
+        if hit:
+            continue
+
+        ids[kept] = ids[i]
+        xs[kept] = x
+        ys[kept] = y
+        dxs[kept] = dxs[i]
+        dys[kept] = dys[i]
+        owner_ids[kept] = owner_ids[i]
+        kept += 1
+
+    return kept, kill_owners[:kills]
+
+def update_bullets():
+    """
+    Run one tick of bullet movement and collisions through step_bullets,
+    then copy health/deaths back onto the players and hand out kills.
+    """
+    global state_dirty
+
+    if bullets.n:
+        state_dirty = True  # bullets in flight move (or vanish) every tick
+
+    pids = list(players)
+    pdatas = list(players.values())
+    health = np.array([pdata.health for pdata in pdatas], dtype=np.int64)
+    dead = np.array([pdata.is_dead for pdata in pdatas], dtype=np.bool_)
+
+    bullets.n, kill_owners = step_bullets(
+        bullets.ids, bullets.xs, bullets.ys, bullets.dxs, bullets.dys, bullets.owner_ids, bullets.n,
+        np.array(pids, dtype=np.int64),
+        np.array([pdata.pos[0] for pdata in pdatas], dtype=np.float32),
+        np.array([pdata.pos[1] for pdata in pdatas], dtype=np.float32),
+        dead,
+        health,
+    )
+
+    for pdata, hp, is_dead in zip(pdatas, health.tolist(), dead.tolist()):
+        pdata.health = hp
+        pdata.is_dead = is_dead
+
+    # Owner gets a kill (if they're still connected)
+    for owner_id in kill_owners.tolist():
+        if owner_id in players:
+            players[owner_id].kills += 1
 
 def game_loop():
     """
     Continually update bullets, collisions, respawns, and broadcast updates.
     """
-    global bullets
+    global tick_id, state_dirty
     while True:
         time.sleep(0.03)  # ~33 updates per second
         with lock:
-            # Move bullets
-            for b in bullets:
-                b["x"] += b["dx"]
-                b["y"] += b["dy"]
-
-            # Remove out-of-bounds bullets
-            bullets = [
-                b for b in bullets
-                if 0 <= b["x"] <= 800 and 0 <= b["y"] <= 600
-            ]
-
-            # Check collisions
-            check_bullet_collisions()
+            tick_id += 1
+
+            # Apply input that arrived since the last tick
+            while True:
+                try:
+                    pid, msg = inputs.get_nowait()
+                except queue.Empty:
+                    break
+                apply_client_msg(pid, msg)
+
+            # Move bullets, remove out-of-bounds ones and check collisions
+            update_bullets()
+
+            # Broadcast state if anything changed (the timer display only
+            # changes once a second), plus a snapshot every SNAPSHOT_INTERVAL
+            # ticks as a heartbeat
+            if (state_dirty or force_snapshot or tick_id % SNAPSHOT_INTERVAL == 0
+                    or int(get_time_left()) != sent_seconds):
+                broadcast_game_state()
+                state_dirty = False
+
+def accept_client(selector, server):
+    global next_player_id, game_start_time
 
-            # Broadcast state
-            broadcast_game_state()
+    try:
+        conn, addr = server.accept()
+    except BlockingIOError:
+        return  # spurious wakeup, or the client already gave up
+    except OSError as e:
+        # e.g. EMFILE or ECONNABORTED, must not take io_loop down with it
+        print(f"[EXCEPTION] accept: {e}")
+        return
+
+    with lock:
+        if len(players) >= MAX_PLAYERS:
+            # Server is full
+            try:
+                conn.setblocking(True)
+                send_msg(conn, ServerFull())
+            except OSError:
+                pass
+            conn.close()
+            return
+
+        # Assign new ID
+        player_id = next_player_id
+        next_player_id += 1
+
+        color = (
+            random.randint(50, 255),
+            random.randint(50, 255),
+            random.randint(50, 255)
+        )
+
+        # Initialize the new player
+        players[player_id] = Player(
+            pos=(400, 300), # random between  50 too 950 for x and 600 to 700 for y
+            color=color, # equipped skin
+            health=100,
+            kills=0,
+            is_dead=False,
+        )
+
+        conn.setblocking(False)
+        outbound[conn] = deque()
+
+        # Queue the handshake before the first broadcast can reach this client
+        handshake_msg = Handshake(
+            player_id=player_id,
+            max_players=MAX_PLAYERS
+        )
+        queue_frame(conn, encode_frame(handshake_msg))
+
+        player_connections[player_id] = conn
+
+        # If we now have at least 2 players, and the timer hasn't started, start it
+        if game_start_time is None and len(players) >= 4:
+            game_start_time = time.time()
+
+    selector.register(conn, selectors.EVENT_READ, data=ClientCtx(player_id, addr))
+    print(f"[NEW CONNECTION] Player {player_id} connected from {addr}")
 
 def main():
-    global next_player_id, client_sockets, player_connections
-    global game_start_time
+    global udp_sock
 
     print("[STARTING] Server is starting...")
+    # Compile step_bullets now rather than on the first tick with players in it
+    update_bullets()
+
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.bind((HOST, PORT))
     server.listen()
-    print(f"[LISTENING] Server is listening on {HOST}:{PORT}")
-
-    threading.Thread(target=game_loop, daemon=True).start()
+    server.setblocking(False)
 
-    while True:
-        conn, addr = server.accept()
-        conn.setblocking(True)
+    udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_sock.bind((HOST, PORT))
+    udp_sock.setblocking(False)
+    print(f"[LISTENING] Server is listening on {HOST}:{PORT} (TCP + UDP)")
 
-        with lock:
-            if len(players) >= MAX_PLAYERS:
-                # Server is full
-                msg = {"action": "server_full"}
-                conn.sendall(pickle.dumps(msg))
-                conn.close()
-                continue
+    threading.Thread(target=game_loop, daemon=True).start()
 
-            # Assign new ID
-            player_id = next_player_id
-            next_player_id += 1
-
-            color = (
-                random.randint(50, 255),
-                random.randint(50, 255),
-                random.randint(50, 255)
-            )
-
-            # Initialize the new player
-            players[player_id] = {
-                "pos": (400, 300), # random between  50 too 950 for x and 600 to 700 for y
-                "color": color, # equipped skin
-                "health": 100,
-                "kills": 0,
-                "is_dead": False,
-            }
-
-            client_sockets.append(conn)
-            player_connections[player_id] = conn
-
-            # If we now have at least 2 players, and the timer hasn't started, start it
-            if game_start_time is None and len(players) >= 4:
-                game_start_time = time.time()
-
-        # Send handshake
-        handshake_msg = {
-            "action": "handshake",
-            "player_id": player_id,
-            "max_players": MAX_PLAYERS
-        }
-        conn.sendall(pickle.dumps(handshake_msg))
-
-        # Spawn thread for this client
-        t = threading.Thread(target=handle_client, args=(conn, addr, player_id), daemon=True)
-        t.start()
+    # All socket I/O happens on this thread
+    io_loop(server)
 
 if __name__ == "__main__":
     main()
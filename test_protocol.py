@@ -0,0 +1,57 @@
+import math
+
+import msgspec
+import pytest
+
+from protocol import (
+    ENC, DEC_CLIENT_MSG, HEADER, MAX_FRAME, MAX_STEP, ClientMsg, FrameTooLarge,
+    encode_frame, unpack_frames,
+)
+
+
+def test_client_msg_round_trip():
+    msg = ClientMsg(action="shoot", player_id=2, dx=0.6, dy=-0.8)
+    assert DEC_CLIENT_MSG.decode(ENC.encode(msg)) == msg
+    msg = ClientMsg(action="udp_port", player_id=2, udp_port=65535)
+    assert DEC_CLIENT_MSG.decode(ENC.encode(msg)) == msg
+
+
+@pytest.mark.parametrize("field, value", [
+    ("dx", math.nan),
+    ("dy", math.inf),
+    ("dx", -math.inf),
+    ("dy", MAX_STEP + 1),
+    ("dx", -MAX_STEP - 1),
+    ("udp_port", 65536),
+    ("udp_port", -1),
+])
+def test_client_msg_rejects_out_of_range(field, value):
+    # Encode a raw array, ClientMsg itself doesn't validate on construction
+    fields = {"dx": 0.0, "dy": 0.0, "udp_port": 0, field: value}
+    payload = ENC.encode(["move", 0, fields["dx"], fields["dy"], fields["udp_port"]])
+    with pytest.raises(msgspec.ValidationError):
+        DEC_CLIENT_MSG.decode(payload)
+
+
+def test_unpack_frames_keeps_partial_frame():
+    frame = bytes(encode_frame(ClientMsg(action="move", player_id=1, dx=5.0)))
+    buf = bytearray(frame[:-1])
+    assert unpack_frames(buf) == []
+    assert buf == frame[:-1]
+    buf += frame[-1:]
+    assert unpack_frames(buf) == [frame[HEADER.size:]]
+    assert buf == b""
+
+
+def test_unpack_frames_splits_coalesced_frames():
+    first = bytes(encode_frame(ClientMsg(action="move", player_id=1, dx=5.0)))
+    second = bytes(encode_frame(ClientMsg(action="shoot", player_id=1, dy=1.0)))
+    buf = bytearray(first + second + second[:3])
+    assert unpack_frames(buf) == [first[HEADER.size:], second[HEADER.size:]]
+    assert buf == second[:3]
+
+
+def test_unpack_frames_rejects_oversize_header():
+    buf = bytearray(HEADER.pack(MAX_FRAME + 1))
+    with pytest.raises(FrameTooLarge):
+        unpack_frames(buf)
@@ -0,0 +1,233 @@
+import copy
+import errno
+import math
+import os
+import random
+
+import numpy as np
+import pytest
+
+import server
+from protocol import ENC, DEC_SERVER_MSG, ClientMsg, GameDelta, GameState, Player
+
+# client calls pygame.init() on import, so it needs a headless display first
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import client
+
+
+def reference_step(players, bullets):
+    """Plain-Python version of step_bullets: move, cull off-screen, then collide in order."""
+    moved = []
+    for x, y, dx, dy, owner_id in bullets:
+        x = float(np.float32(x) + np.float32(dx))
+        y = float(np.float32(y) + np.float32(dy))
+        if 0 <= x <= 800 and 0 <= y <= 600:
+            moved.append((x, y, owner_id))
+
+    kept = []
+    for x, y, owner_id in moved:
+        for player_id, player in players.items():
+            if player_id == owner_id or player.is_dead:
+                continue
+            px, py = player.pos
+            if abs(x - px) <= 14 and abs(y - py) <= 14:
+                player.health -= 25
+                if player.health <= 0:
+                    player.health = 0
+                    player.is_dead = True
+                    if owner_id in players:
+                        players[owner_id].kills += 1
+                break
+        else:
+            kept.append((x, y, owner_id))
+    return kept
+
+
+def run_step(monkeypatch, players, bullets):
+    monkeypatch.setattr(server, "players", players)
+    monkeypatch.setattr(server, "bullets", server.Bullets(capacity=4))
+    monkeypatch.setattr(server, "state_dirty", False)
+    for bullet in bullets:
+        server.bullets.add(*bullet)
+    server.update_bullets()
+    return [(b.x, b.y, b.owner_id) for b in server.bullets.to_wire()]
+
+
+def test_step_bullets_matches_reference(monkeypatch):
+    rng = random.Random(1234)
+    for _ in range(2000):
+        players = {
+            player_id: Player(
+                pos=(rng.randint(-30, 830), rng.randint(-30, 630)),
+                color=(255, 255, 255),
+                health=rng.choice([25, 50, 100]),
+                is_dead=rng.random() < 0.2,
+            )
+            for player_id in range(rng.randint(0, 6))
+        }
+        targets = [p.pos for p in players.values()] or [(400, 300)]
+        bullets = []
+        for _ in range(rng.randint(0, 40)):
+            tx, ty = rng.choice(targets)
+            bullets.append((
+                min(800, max(0, tx + rng.randint(-25, 25))),
+                min(600, max(0, ty + rng.randint(-25, 25))),
+                rng.choice([0, 5, -5, 3.5]),
+                rng.choice([0, 5, -5]),
+                rng.randint(0, 6),
+            ))
+
+        expected_players = copy.deepcopy(players)
+        expected = reference_step(expected_players, bullets)
+        assert run_step(monkeypatch, players, bullets) == expected
+        assert players == expected_players
+
+
+def test_step_bullets_drops_non_finite(monkeypatch):
+    players = {0: Player(pos=(400, 300), color=(255, 255, 255))}
+    bullets = [
+        (400, 300, math.nan, 0, 1),
+        (400, 300, 0, math.nan, 1),
+        (400, 300, math.inf, 0, 1),
+        (400, 300, 0, -math.inf, 1),
+        (100, 100, 1, 1, 1),
+    ]
+    assert run_step(monkeypatch, players, bullets) == [(101.0, 101.0, 1)]
+    assert players[0].health == 100
+
+
+def test_shots_capped_at_max_bullets(monkeypatch):
+    monkeypatch.setattr(server, "players", {0: Player(pos=(400, 300), color=(255, 255, 255))})
+    monkeypatch.setattr(server, "bullets", server.Bullets(capacity=4))
+    monkeypatch.setattr(server, "state_dirty", False)
+    shot = ClientMsg(action="shoot", player_id=0, dx=1.0)
+    for _ in range(server.MAX_BULLETS + 5):
+        server.apply_client_msg(0, shot)
+    assert server.bullets.n == server.MAX_BULLETS
+
+    snapshot = GameState(tick=0, players=server.players, bullets=server.bullets.to_wire(), time_left=300.0)
+    assert len(ENC.encode(snapshot)) <= server.MAX_DATAGRAM
+
+
+def test_oversize_state_keeps_delta_baseline(monkeypatch):
+    monkeypatch.setattr(server, "players", {0: Player(pos=(400, 300), color=(255, 255, 255))})
+    monkeypatch.setattr(server, "bullets", server.Bullets(capacity=4))
+    monkeypatch.setattr(server, "udp_clients", {})
+    monkeypatch.setattr(server, "udp_buf", bytearray())
+    monkeypatch.setattr(server, "force_snapshot", True)
+    monkeypatch.setattr(server, "sent_players", {})
+    monkeypatch.setattr(server, "sent_bullet_ids", np.empty(0, dtype=np.int64))
+    monkeypatch.setattr(server, "sent_seconds", None)
+    monkeypatch.setattr(server, "MAX_DATAGRAM", 8)
+
+    server.broadcast_game_state()
+    assert server.force_snapshot
+    assert server.sent_players == {}
+
+    monkeypatch.setattr(server, "MAX_DATAGRAM", 65507)
+    server.broadcast_game_state()
+    assert not server.force_snapshot
+    assert server.sent_players == server.players
+
+
+@pytest.mark.parametrize("error", [BlockingIOError(), ConnectionAbortedError(), OSError(errno.EMFILE, "Too many open files")])
+def test_accept_errors_dont_escape(error):
+    class FailingListener:
+        def accept(self):
+            raise error
+
+    server.accept_client(None, FailingListener())
+
+
+def test_deltas_rebuild_the_snapshot(monkeypatch):
+    white = (255, 255, 255)
+    monkeypatch.setattr(server, "players", {
+        0: Player(pos=(100, 300), color=white),
+        1: Player(pos=(500, 300), color=white),
+        2: Player(pos=(790, 500), color=white),
+    })
+    monkeypatch.setattr(server, "bullets", server.Bullets(capacity=4))
+    monkeypatch.setattr(server, "udp_clients", {})
+    monkeypatch.setattr(server, "udp_buf", bytearray())
+    monkeypatch.setattr(server, "tick_id", 0)
+    monkeypatch.setattr(server, "SNAPSHOT_INTERVAL", 10**6)  # no heartbeat snapshots
+    monkeypatch.setattr(server, "force_snapshot", True)
+    monkeypatch.setattr(server, "state_dirty", False)
+    monkeypatch.setattr(server, "sent_players", {})
+    monkeypatch.setattr(server, "sent_bullet_ids", np.empty(0, dtype=np.int64))
+    monkeypatch.setattr(server, "sent_seconds", None)
+    monkeypatch.setattr(server, "game_start_time", None)
+    monkeypatch.setattr(client, "players", {})
+    monkeypatch.setattr(client, "bullets", {})
+    monkeypatch.setattr(client, "last_tick", -1)
+    monkeypatch.setattr(client, "time_left", 300)
+    monkeypatch.setattr(client, "render_state", client.render_state)
+
+    def step(*msgs, skip=0):
+        """
+        Run skip ticks that aren't broadcast, then one with msgs applied that
+        is. Returns what was sent and a full snapshot of the same tick.
+        """
+        for _ in range(skip):
+            server.tick_id += 1
+            server.update_bullets()
+        server.tick_id += 1
+        for pid, msg in msgs:
+            server.apply_client_msg(pid, msg)
+        server.update_bullets()
+        server.broadcast_game_state()
+        sent = DEC_SERVER_MSG.decode(server.udp_buf)
+        snapshot = GameState(tick=server.tick_id, players=server.players,
+                             bullets=server.bullets.to_wire(), time_left=sent.time_left)
+        return sent, DEC_SERVER_MSG.decode(ENC.encode(snapshot))
+
+    def check(sent, snapshot):
+        assert sent.tick > client.last_tick
+        client.apply_state(sent)
+        client.last_tick = sent.tick
+        assert client.players == snapshot.players
+        assert sorted(client.bullets) == [b.id for b in snapshot.bullets]
+        for b in snapshot.bullets:
+            got = client.bullets[b.id]
+            assert (got.x, got.y) == (pytest.approx(b.x, abs=1e-3), pytest.approx(b.y, abs=1e-3))
+
+    sent, snapshot = step()
+    assert isinstance(sent, GameState)
+    check(sent, snapshot)
+
+    # 0 and 1 shoot at each other, 2 shoots off the right edge
+    sent, snapshot = step((0, ClientMsg(action="move", player_id=0, dx=5.0)),
+                          (0, ClientMsg(action="shoot", player_id=0, dx=1.0)),
+                          (1, ClientMsg(action="shoot", player_id=1, dx=-1.0)),
+                          (2, ClientMsg(action="shoot", player_id=2, dx=1.0)))
+    assert isinstance(sent, GameDelta) and len(sent.new_bullets) == 3
+    check(sent, snapshot)
+
+    # A skipped tick gap: bullets in flight have to be extrapolated across it
+    sent, snapshot = step(skip=3)
+    assert sent.removed_bullets and snapshot.bullets
+    check(sent, snapshot)
+
+    sent, snapshot = step((1, ClientMsg(action="move", player_id=1, dy=-5.0)))
+    assert list(sent.players) == [1]
+    check(sent, snapshot)
+
+    # One player leaves and another joins
+    del server.players[2]
+    server.players[3] = Player(pos=(400, 500), color=white)
+    sent, snapshot = step(skip=5)
+    assert sent.removed_players == [2] and list(sent.players) == [3]
+    check(sent, snapshot)
+
+    # The remaining bullets hit 0 and 1
+    sent, snapshot = step(skip=40)
+    assert not snapshot.bullets
+    assert snapshot.players[0].health == snapshot.players[1].health == 75
+    check(sent, snapshot)
+
+    # And the next real snapshot agrees with what the deltas built
+    server.force_snapshot = True
+    sent, snapshot = step()
+    assert isinstance(sent, GameState)
+    assert sent.players == client.players and not client.bullets